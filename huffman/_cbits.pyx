@@ -0,0 +1,135 @@
+# huffman/_cbits.pyx
+# cython: language_level=3, boundscheck=False, wraparound=False
+
+"""
+Optional C versions of the hot encode/decode loops.
+
+Same signatures and results as huffman/_kernels.py, but the bit-buffer
+lives in a C uint64 and the tables in typed C arrays, so the per-byte
+and per-bit work never touches a Python object.
+Build in place with: cythonize -i huffman/_cbits.pyx
+"""
+
+from array import array
+from libc.stdint cimport uint8_t, uint64_t
+
+def build_encode_table(codes, lens):
+    """Prepares the code table for encode_bits, as typed arrays."""
+    return array('Q', codes), array('B', lens)
+
+def encode_bits(const uint8_t[:] data, table, uint8_t[:] out,
+                Py_ssize_t pos, buf, int nbits):
+    """
+    Shifts the code of every byte of 'data' into the bit-buffer,
+    flushing it into the pre-sized 'out', starting at byte 'pos'.
+    'table' comes from build_encode_table.
+    Returns the leftover (pos, buf, nbits) for the caller to carry on with.
+    """
+    cdef const uint64_t[:] codes = table[0]
+    cdef const uint8_t[:] lens = table[1]
+    cdef uint64_t c_buf = buf
+    cdef Py_ssize_t i = 0, k, n = data.shape[0]
+    cdef uint8_t first, second
+
+    # Drain the carried-in bits down to a partial byte
+    while nbits >= 8:
+        nbits -= 8
+        out[pos] = <uint8_t>(c_buf >> nbits)
+        pos += 1
+
+    # 8 bytes per iteration, two codes (at most 30 bits) at a time.
+    # Flushing whenever 32 bits are pending keeps the buffer under
+    # 31 + 30 bits, so it never overflows 64 bits.
+    while i + 8 <= n:
+        for k in range(i, i + 8, 2):
+            first = data[k]
+            second = data[k + 1]
+            c_buf = (c_buf << lens[first]) | codes[first]
+            c_buf = (c_buf << lens[second]) | codes[second]
+            nbits += lens[first] + lens[second]
+            if nbits >= 32:
+                nbits -= 32
+                out[pos] = <uint8_t>(c_buf >> (nbits + 24))
+                out[pos + 1] = <uint8_t>(c_buf >> (nbits + 16))
+                out[pos + 2] = <uint8_t>(c_buf >> (nbits + 8))
+                out[pos + 3] = <uint8_t>(c_buf >> nbits)
+                pos += 4
+        i += 8
+
+    # Tail: one byte at a time
+    while True:
+        while nbits >= 8:
+            nbits -= 8
+            out[pos] = <uint8_t>(c_buf >> nbits)
+            pos += 1
+        if i == n:
+            break
+        first = data[i]
+        c_buf = (c_buf << lens[first]) | codes[first]
+        nbits += lens[first]
+        i += 1
+
+    return pos, int(c_buf & ((<uint64_t>1 << nbits) - 1)), nbits
+
+def decode_bits(const uint8_t[:] packed_data, Py_ssize_t bit_pos,
+                Py_ssize_t end_bit, table_sym, table_len, int lookup_bits,
+                children, sym, Py_ssize_t text_len):
+    """
+    Decodes 'text_len' bytes from 'packed_data', starting at 'bit_pos'.
+    Raises ValueError if that takes more than the bits up to 'end_bit'.
+    """
+    cdef int[:] c_table_sym = array('i', table_sym)
+    cdef int[:] c_table_len = array('i', table_len)
+    cdef int[:] c_children = array('i', children)
+    cdef int[:] c_sym = array('i', sym)
+
+    decoded_bytes = bytearray(text_len)
+    cdef uint8_t[:] out = decoded_bytes
+    cdef uint64_t mask = (<uint64_t>1 << lookup_bits) - 1
+    cdef Py_ssize_t size = packed_data.shape[0]
+    cdef Py_ssize_t i, pos
+    cdef uint64_t buf
+    cdef int nbits, length, index, node
+
+    # Start the reservoir mid-byte at 'bit_pos'
+    pos = bit_pos >> 3
+    nbits = 8 - (bit_pos & 7)
+    buf = packed_data[pos] & ((1 << nbits) - 1) if pos < size else 0
+    pos += 1
+
+    for i in range(text_len):
+        # Top up the reservoir (past the end, read '0' bits)
+        if nbits < lookup_bits:
+            if (pos << 3) - nbits > end_bit:
+                raise ValueError("Encoded data ends before the last symbol")
+            while nbits <= 56:
+                buf = (buf << 8) | (packed_data[pos] if pos < size else 0)
+                pos += 1
+                nbits += 8
+
+        index = <int>((buf >> (nbits - lookup_bits)) & mask)
+        length = c_table_len[index]
+        if length:
+            out[i] = <uint8_t>c_table_sym[index]
+            nbits -= length
+            continue
+
+        # Long code: walk the rest of it bit by bit
+        node = c_table_sym[index]
+        nbits -= lookup_bits
+        if node < 0:
+            raise ValueError("Code has no symbol for this bit pattern")
+        while c_sym[node] < 0:
+            if not nbits:
+                buf = packed_data[pos] if pos < size else 0
+                pos += 1
+                nbits = 8
+            nbits -= 1
+            node = c_children[(node << 1) | <int>((buf >> nbits) & 1)]
+            if node < 0:
+                raise ValueError("Code has no symbol for this bit pattern")
+        out[i] = <uint8_t>c_sym[node]
+
+    if (pos << 3) - nbits > end_bit:
+        raise ValueError("Encoded data ends before the last symbol")
+    return decoded_bytes
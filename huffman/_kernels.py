@@ -0,0 +1,133 @@
+# huffman/_kernels.py
+
+"""
+The hot encode/decode loops.
+
+These are plain module-level functions over flat lists of ints,
+kept apart from HuffmanCompressor so the per-byte and per-bit
+work only ever touches local variables.
+"""
+
+import struct
+import sys
+
+# A 64-bit big-endian word, as flushed from the encoder's bit-buffer
+_WORD = struct.Struct('>Q')
+
+def build_encode_table(codes: list[int], lens: list[int]) -> tuple:
+    """
+    Prepares the code table for encode_bits.
+    
+    Besides the per-byte codes, this builds a table over every pair
+    of bytes, indexed by the pair read as a native-endian 16-bit unit,
+    so the encoder can shift in two codes per loop iteration.
+    """
+    pair_codes = [0] * 65536
+    pair_lens = [0] * 65536
+    little = sys.byteorder == 'little'
+    for first in range(256):
+        for second in range(256):
+            unit = (second << 8 | first) if little else (first << 8 | second)
+            pair_codes[unit] = (codes[first] << lens[second]) | codes[second]
+            pair_lens[unit] = lens[first] + lens[second]
+    return codes, lens, pair_codes, pair_lens
+
+def encode_bits(data: bytes, table: tuple, out: bytearray,
+                pos: int, buf: int, nbits: int) -> tuple[int, int, int]:
+    """
+    Shifts the code of every byte of 'data' into the bit-buffer,
+    flushing it one 64-bit word at a time into the pre-sized 'out',
+    starting at byte 'pos'. 'table' comes from build_encode_table.
+    Returns the leftover (pos, buf, nbits) for the caller to carry on with.
+    """
+    codes, lens, pair_codes, pair_lens = table
+    pack_into = _WORD.pack_into
+    view = memoryview(data)
+    even = len(view) & ~1
+
+    # Two bytes per iteration, then the odd byte out (if any)
+    for unit in view[:even].cast('H'):
+        buf = (buf << pair_lens[unit]) | pair_codes[unit]
+        nbits += pair_lens[unit]
+
+        # Flush once the buffer holds a full 64-bit word
+        if nbits >= 64:
+            nbits -= 64
+            pack_into(out, pos, buf >> nbits)
+            pos += 8
+            buf &= (1 << nbits) - 1
+
+    for byte in view[even:]:
+        buf = (buf << lens[byte]) | codes[byte]
+        nbits += lens[byte]
+
+    while nbits >= 64:
+        nbits -= 64
+        pack_into(out, pos, buf >> nbits)
+        pos += 8
+        buf &= (1 << nbits) - 1
+
+    return pos, buf, nbits
+
+def decode_bits(packed_data: bytes, bit_pos: int, end_bit: int,
+                table_sym: list[int], table_len: list[int], lookup_bits: int,
+                children: list[int], sym: list[int], text_len: int) -> bytearray:
+    """
+    Decodes 'text_len' bytes from 'packed_data', starting at 'bit_pos'.
+    Raises ValueError if that takes more than the bits up to 'end_bit'
+    (a truncated file); only the final peek may run past them.
+    
+    Bits are kept in an integer reservoir; each step peeks the next
+    'lookup_bits' bits, looks the symbol up and consumes only its
+    code length. Slots with length 0 are long codes, finished off by
+    walking the decode tree (children/sym lists) from the node id
+    stored in the slot, one bit at a time.
+    """
+    decoded_bytes = bytearray(text_len)
+    mask = (1 << lookup_bits) - 1
+    size = len(packed_data)
+
+    # Start the reservoir mid-byte at 'bit_pos'
+    pos = bit_pos >> 3
+    nbits = 8 - (bit_pos & 7)
+    buf = packed_data[pos] & ((1 << nbits) - 1) if pos < size else 0
+    pos += 1
+
+    for i in range(text_len):
+        # Top up the reservoir with 7 bytes at once (past the end, read '0' bits)
+        if nbits < lookup_bits:
+            if (pos << 3) - nbits > end_bit:
+                raise ValueError("Encoded data ends before the last symbol")
+            chunk = packed_data[pos:pos + 7]
+            chunk_bits = int.from_bytes(chunk, 'big') << ((7 - len(chunk)) << 3)
+            buf = ((buf & ((1 << nbits) - 1)) << 56) | chunk_bits
+            pos += 7
+            nbits += 56
+
+        index = (buf >> (nbits - lookup_bits)) & mask
+        length = table_len[index]
+        if length:
+            decoded_bytes[i] = table_sym[index]
+            nbits -= length
+            continue
+
+        # Long code: walk the rest of it bit by bit
+        node = table_sym[index]
+        nbits -= lookup_bits
+        if node < 0:
+            raise ValueError("Code has no symbol for this bit pattern")
+        while sym[node] < 0:
+            if not nbits:
+                buf = packed_data[pos] if pos < size else 0
+                pos += 1
+                nbits = 8
+            nbits -= 1
+            node = children[(node << 1) | ((buf >> nbits) & 1)]
+            if node < 0:
+                raise ValueError("Code has no symbol for this bit pattern")
+        decoded_bytes[i] = sym[node]
+
+    # Bits consumed so far: (pos << 3) - nbits
+    if (pos << 3) - nbits > end_bit:
+        raise ValueError("Encoded data ends before the last symbol")
+    return decoded_bytes
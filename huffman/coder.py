@@ -6,21 +6,46 @@ The main HuffmanCompressor class.
 This class encapsulates all logic for compression
 and decompression, including:
 - Building frequency tables
-- Building the Huffman tree (using a min-priority queue)
-- Generating the code table
+- Computing Huffman code lengths (in place, without building a tree)
+- Generating the canonical code table
 - Packing/unpacking data to/from a binary file format
 """
 
-import heapq
+import io
+import os
+import stat
+import struct
 from collections import Counter
-from .node import HuffmanNode
+
+# Use the compiled kernels if they were built, else the pure-Python ones
+try:
+    from ._cbits import build_encode_table, encode_bits, decode_bits
+except ImportError:
+    from ._kernels import build_encode_table, encode_bits, decode_bits
+
+# File header: text length (8 bytes), tree length (4 bytes), padding (1 byte)
+HEADER = struct.Struct('>QIB')
+
+# Bytes of input encoded per chunk when compressing
+CHUNK_SIZE = 1 << 20
+
+# Size of the serialized code lengths (256 nibbles), in bytes
+TREE_SIZE = 128
+
+# Longest code the compressor will assign (fits a 4-bit nibble)
+MAX_CODE_LEN = 15
+
+# Max code length resolved by a single decode table lookup
+LOOKUP_BITS = 12
 
 class HuffmanCompressor:
     """Handles the compression and decompression of files."""
 
     def __init__(self):
-        self.tree: HuffmanNode | None = None
-        self.code_table: dict[int, str] = {}
+        self.codes: list[int] = []
+        self.lens: list[int] = []
+        self.children: list[int] = []
+        self.sym: list[int] = []
         
     def _read_file(self, path: str) -> bytes:
         """Reads a file in binary mode."""
@@ -32,138 +57,326 @@ class HuffmanCompressor:
         with open(path, 'wb') as f:
             f.write(data)
 
-    def _build_freq_table(self, data: bytes) -> Counter:
-        """Builds a frequency table from the input data."""
-        return Counter(data) # Counter is a dict-like object
-
-    def _build_tree(self, freq_table: Counter):
-        """Builds the Huffman tree using a min-priority queue."""
-        
-        # Create a min-priority queue (min-heap) of leaf nodes
-        priority_queue = [
-            HuffmanNode(freq=count, char=byte) 
-            for byte, count in freq_table.items()
-        ]
-        heapq.heapify(priority_queue) # Turn list into a heap
-
-        # While there is more than one node in the queue
-        while len(priority_queue) > 1:
-            # Pop the two nodes with the *smallest* frequency
-            left = heapq.heappop(priority_queue)
-            right = heapq.heappop(priority_queue)
-
-            # Create a new internal parent node
-            parent_freq = left.freq + right.freq
-            parent = HuffmanNode(freq=parent_freq, left=left, right=right)
-
-            # Push the new parent node back into the queue
-            heapq.heappush(priority_queue, parent)
-
-        # The last remaining node is the root of the tree
-        self.tree = priority_queue[0]
-
-    def _build_code_table(self):
-        """Generates the {char: bit_code} mapping by traversing the tree."""
-        self.code_table = {}
-        
-        def _traverse(node: HuffmanNode, current_code: str):
-            # If this is an internal node, go deeper
-            if node.left: # Huffman trees are full, so no need to check right
-                _traverse(node.left, current_code + '0')
-                _traverse(node.right, current_code + '1')
-            # If this is a leaf node, save the code
-            else:
-                self.code_table[node.char] = current_code
+    def _build_freq_table(self, in_file) -> list[int]:
+        """
+        Builds a frequency table from 'in_file', read CHUNK_SIZE bytes
+        at a time.
+        The table is a dense list of 256 counts indexed by byte value;
+        Counter still does the actual counting, in C.
+        """
+        counts = Counter()
+        while chunk := in_file.read(CHUNK_SIZE):
+            counts.update(chunk)
+        freq_table = [0] * 256
+        for byte, count in counts.items():
+            freq_table[byte] = count
+        return freq_table
 
+    def _build_code_lengths(self, freq_table: list[int]):
+        """
+        Computes the Huffman code length of every byte straight from the
+        frequencies, without building a tree.
+        
+        Uses Moffat and Katajainen's in-place algorithm on the present
+        bytes sorted by frequency. It works within a single list, which
+        ends up holding the code lengths:
+        1. Pair up the two lightest items, as the tree build would,
+           leaving each internal node's weight and then parent index
+        2. Turn parent indices into depths, from the root down
+        3. Turn the internal-node depths into leaf depths (code lengths)
+        """
+        self.lens = [0] * 256
+        symbols = sorted((byte for byte in range(256) if freq_table[byte]),
+                         key=lambda byte: freq_table[byte])
+        n = len(symbols)
+        
         # Handle edge case: file with only one unique byte
-        if self.tree and not self.tree.left:
-             self.code_table[self.tree.char] = '0'
-        elif self.tree:
-             _traverse(self.tree, "")
+        if n == 1:
+            self.lens[symbols[0]] = 1
+            return
+        
+        a = [freq_table[byte] for byte in symbols]
+        
+        # 1. Merge the two lightest of the leaves and the internal nodes
+        a[0] += a[1]
+        root, leaf = 0, 2
+        for nxt in range(1, n - 1):
+            if leaf >= n or a[root] < a[leaf]:
+                a[nxt] = a[root]
+                a[root] = nxt
+                root += 1
+            else:
+                a[nxt] = a[leaf]
+                leaf += 1
+            
+            if leaf >= n or (root < nxt and a[root] < a[leaf]):
+                a[nxt] += a[root]
+                a[root] = nxt
+                root += 1
+            else:
+                a[nxt] += a[leaf]
+                leaf += 1
+        
+        # 2. Parent indices to internal-node depths
+        a[n - 2] = 0
+        for nxt in range(n - 3, -1, -1):
+            a[nxt] = a[a[nxt]] + 1
+        
+        # 3. Internal-node depths to leaf depths, deepest leaves first
+        avail, depth = 1, 0
+        root, nxt = n - 2, n - 1
+        while avail > 0:
+            used = 0
+            while root >= 0 and a[root] == depth:
+                used += 1
+                root -= 1
+            while avail > used:
+                a[nxt] = depth
+                nxt -= 1
+                avail -= 1
+            avail = 2 * used
+            depth += 1
+        
+        for byte, length in zip(symbols, a):
+            self.lens[byte] = length
+
+    def _build_code_table(self, freq_table: list[int]):
+        """
+        Generates the code table from the byte frequencies.
+        The Huffman code lengths are capped at MAX_CODE_LEN, and the
+        codes themselves are then assigned canonically.
+        """
+        self._build_code_lengths(freq_table)
+        self._limit_code_lengths()
+        self._assign_canonical_codes()
 
-    def _serialize_tree(self) -> str:
+    def _limit_code_lengths(self):
         """
-        Serializes the tree into a bit string.
-        '0' = Internal Node
-        '1' = Leaf Node, followed by 8 bits for the char byte.
+        Caps the code lengths at MAX_CODE_LEN.
+        
+        Works on the count of codes per length: two codes past the cap
+        are replaced by one a level up, and a shorter code is split into
+        two one level down to make room, which keeps the code complete.
+        The new lengths are then handed back out shortest-first, in the
+        order of the original lengths, so frequent bytes keep short codes.
         """
-        bits = ""
+        max_len = max(self.lens)
+        if max_len <= MAX_CODE_LEN:
+            return
+        
+        count = [0] * (max_len + 1)
+        for length in self.lens:
+            count[length] += 1
         
-        def _traverse(node: HuffmanNode):
-            nonlocal bits
-            if node.char is not None: # Leaf node
-                bits += '1'
-                bits += f'{node.char:08b}' # Append 8-bit byte
-            else: # Internal node
-                bits += '0'
-                _traverse(node.left)
-                _traverse(node.right)
+        for length in range(max_len, MAX_CODE_LEN, -1):
+            while count[length]:
+                # Find the deepest length (at least two up) with a code to split
+                shorter = length - 2
+                while not count[shorter]:
+                    shorter -= 1
+                count[length] -= 2
+                count[length - 1] += 1
+                count[shorter + 1] += 2
+                count[shorter] -= 1
         
-        _traverse(self.tree)
-        return bits
+        symbols = sorted((byte for byte in range(256) if self.lens[byte]), 
+                         key=lambda byte: self.lens[byte])
+        length = 1
+        for byte in symbols:
+            while not count[length]:
+                length += 1
+            self.lens[byte] = length
+            count[length] -= 1
 
-    def _encode_data(self, data: bytes) -> str:
-        """Encodes the raw data into a single bit string."""
-        return "".join(self.code_table[byte] for byte in data)
+    def _assign_canonical_codes(self):
+        """
+        Assigns canonical codes from the code lengths.
+        
+        The encoder and decoder both derive the same codes from the
+        lengths alone. Starting from the longest length, each length's
+        first code follows from the count of codes one level deeper;
+        within a length, codes are handed out in symbol order.
+        """
+        max_len = max(self.lens)
+        count = [0] * (max_len + 2)
+        for length in self.lens:
+            count[length] += 1
+        
+        # First code of each length, from the longest up
+        next_code = [0] * (max_len + 2)
+        for length in range(max_len, 0, -1):
+            next_code[length] = (next_code[length + 1] + count[length + 1]) >> 1
+        
+        self.codes = [0] * 256
+        for byte, length in enumerate(self.lens):
+            if length:
+                self.codes[byte] = next_code[length]
+                next_code[length] += 1
 
-    def _pack_data(self, text_len: int, tree_bits: str, data_bits: str) -> bytes:
+    def _build_decode_table(self) -> tuple[list[int], list[int], int]:
         """
-        Packs the header and data into a final byte array.
+        Builds a direct lookup table over the next 'lookup_bits' bits.
         
-        File Format:
-        [ 8 bytes ] Original text length (for decoder)
-        [ 4 bytes ] Tree bit-string length (for decoder)
-        [ 1 byte  ] Padding bits (0-7)
-        [ N bytes ] Packed (tree + data) bits
-        """
-        total_bits = tree_bits + data_bits
-        
-        # Calculate padding
-        padding = (8 - (len(total_bits) % 8)) % 8
-        total_bits += '0' * padding
-        
-        # Create the header
-        header = bytearray()
-        header.extend(text_len.to_bytes(8, 'big'))       # 8 bytes for text length
-        header.extend(len(tree_bits).to_bytes(4, 'big')) # 4 bytes for tree length
-        header.extend(padding.to_bytes(1, 'big'))        # 1 byte for padding
-
-        # Pack the bits into bytes
-        packed_data = bytearray()
-        for i in range(0, len(total_bits), 8):
-            byte_str = total_bits[i:i+8]
-            packed_data.append(int(byte_str, 2))
+        Each slot holds the symbol and its code length, so decoding a
+        symbol is a single table hit instead of a walk down the tree.
+        Codes longer than LOOKUP_BITS share a slot per prefix; that slot
+        has length 0 and holds the id of the decode tree node for the
+        remaining bits.
+        
+        The decode tree is kept as lists indexed by node id rather than
+        node objects: self.children holds the left and right child of
+        node k at 2k and 2k + 1, so a walk step is children[2k + bit]
+        with no branch on the bit; self.sym is -1 for internal nodes.
+        """
+        lookup_bits = min(max(self.lens), LOOKUP_BITS)
+        table_sym = [-1] * (1 << lookup_bits)
+        table_len = [0] * (1 << lookup_bits)
+        self.children, self.sym = [], []
+        
+        def _new_node() -> int:
+            self.children += (-1, -1)
+            self.sym.append(-1)
+            return len(self.sym) - 1
+        
+        for byte, length in enumerate(self.lens):
+            if not length:
+                continue
+            code = self.codes[byte]
+            
+            # Short code: fill every slot that starts with it
+            if length <= lookup_bits:
+                shift = lookup_bits - length
+                start = code << shift
+                for i in range(start, start + (1 << shift)):
+                    table_sym[i] = byte
+                    table_len[i] = length
+                continue
             
-        return bytes(header + packed_data)
+            # Long code: insert the remaining bits under its prefix
+            prefix = code >> (length - lookup_bits)
+            if table_sym[prefix] < 0:
+                table_sym[prefix] = _new_node()
+            node = table_sym[prefix]
+            for shift in range(length - lookup_bits - 1, -1, -1):
+                child = (node << 1) | ((code >> shift) & 1)
+                if self.children[child] < 0:
+                    self.children[child] = _new_node()
+                node = self.children[child]
+            self.sym[node] = byte
+        
+        return table_sym, table_len, lookup_bits
 
-    def compress(self, input_path: str, output_path: str) -> tuple[int, int]:
-        """Compresses a file and writes the result."""
-        print(f"Compressing '{input_path}'...")
+    def _serialize_tree(self, packed_data: bytearray, pos: int) -> int:
+        """
+        Serializes the code table as the 256 code lengths, one 4-bit
+        nibble per byte value (0 = byte not present), writing them into
+        'packed_data' at byte 'pos'.
+        Canonical codes follow from the lengths alone, so the decoder
+        needs nothing else to rebuild them.
+        Returns the number of bits written.
+        """
+        lens = self.lens
+        for i in range(TREE_SIZE):
+            packed_data[pos + i] = (lens[2 * i] << 4) | lens[2 * i + 1]
+        return TREE_SIZE * 8
+
+    def _encode_stream(self, in_file, out_file, text_len: int) -> tuple[int, int]:
+        """
+        Writes the code lengths, then the encoded 'in_file', to 'out_file'.
         
-        # 1. Read data
-        data = self._read_file(input_path)
-        if not data:
-            print("File is empty. Nothing to compress.")
-            return 0, 0
-        original_size = len(data)
+        The input is read CHUNK_SIZE bytes at a time, and the bit-buffer
+        state (buf, nbits) carries over from one chunk to the next, so
+        memory use stays bounded whatever the file size. Each chunk is
+        encoded into one reused output buffer, sized for the worst case
+        (every byte getting the longest code).
+        Raises ValueError if the input is not the 'text_len' bytes that
+        were counted, or holds a byte with no code (which would otherwise
+        be silently dropped).
+        Returns the number of tree bits and the number of padding bits (0-7).
+        """
+        chunk_out = bytearray(max(TREE_SIZE, CHUNK_SIZE * max(self.lens) // 8 + 16))
+        table = build_encode_table(self.codes, self.lens)
+        coded = bytes(byte for byte in range(256) if self.lens[byte])
+        buf, nbits = 0, 0
         
-        # 2. Build frequency table and tree
-        freq_table = self._build_freq_table(data)
-        self._build_tree(freq_table)
+        with memoryview(chunk_out) as view:
+            tree_len = self._serialize_tree(chunk_out, 0)
+            out_file.write(view[:tree_len // 8])
+            
+            read_len = 0
+            while chunk := in_file.read(CHUNK_SIZE):
+                read_len += len(chunk)
+                # Deleting every byte that has a code should leave nothing
+                if chunk.translate(None, coded):
+                    raise ValueError("Input changed while compressing "
+                                     "(found bytes that were not counted)")
+                pos, buf, nbits = encode_bits(chunk, table, chunk_out, 0, buf, nbits)
+                out_file.write(view[:pos])
         
-        # 3. Build code table
-        self._build_code_table()
+        if read_len != text_len:
+            raise ValueError(f"Input changed while compressing "
+                             f"({text_len} bytes counted, {read_len} read)")
         
-        # 4. Serialize tree and encode data
-        tree_bits = self._serialize_tree()
-        data_bits = self._encode_data(data)
+        # Pad the remaining bits with '0's to make full bytes
+        padding = (8 - (nbits % 8)) % 8
+        out_file.write((buf << padding).to_bytes((nbits + padding) // 8, 'big'))
+        return tree_len, padding
+
+    def _pack_header(self, text_len: int, tree_len: int, padding: int) -> bytes:
+        """
+        Packs the file header.
+        
+        File Format:
+        [ 8 bytes   ] Original text length (for decoder)
+        [ 4 bytes   ] Code-length block size in bits (always 1024)
+        [ 1 byte    ] Padding bits (0-7)
+        [ 128 bytes ] Code lengths, one 4-bit nibble per byte value 0-255
+        [ N bytes   ] Packed data bits
+        """
+        return HEADER.pack(text_len, tree_len, padding)
+
+    def compress(self, input_path: str, output_path: str) -> tuple[int, int]:
+        """
+        Compresses a file and writes the result.
+        Makes two passes over the input, both chunk by chunk: one to
+        count byte frequencies, one to encode it straight into the
+        output file. Anything but a regular file (pipes, devices) can
+        only be read once, so it is read into memory instead.
+        """
+        print(f"Compressing '{input_path}'...")
         
-        # 5. Pack data into binary format
-        packed_bytes = self._pack_data(original_size, tree_bits, data_bits)
-        compressed_size = len(packed_bytes)
+        # 1. Open the input file
+        if stat.S_ISREG(os.stat(input_path).st_mode):
+            in_file = open(input_path, 'rb')
+        else:
+            in_file = io.BytesIO(self._read_file(input_path))
         
-        # 6. Write to file
-        self._write_file(output_path, packed_bytes)
+        with in_file:
+            # 2. Build frequency table
+            freq_table = self._build_freq_table(in_file)
+            original_size = sum(freq_table)
+            if original_size == 0:
+                print("File is empty. Nothing to compress.")
+                return 0, 0
+            
+            # 3. Build code table
+            self._build_code_table(freq_table)
+            
+            in_file.seek(0)
+            try:
+                with open(output_path, 'wb') as out_file:
+                    # 4. Encode data after a placeholder header
+                    out_file.write(bytes(HEADER.size))
+                    tree_len, padding = self._encode_stream(in_file, out_file, original_size)
+                    compressed_size = out_file.tell()
+                    
+                    # 5. Go back and fill in the header
+                    out_file.seek(0)
+                    out_file.write(self._pack_header(original_size, tree_len, padding))
+            except ValueError:
+                # Don't leave a half-written file with a zeroed header behind
+                os.remove(output_path)
+                raise
         
         print(f"Original size: {original_size} bytes")
         print(f"Compressed size: {compressed_size} bytes")
@@ -172,43 +385,50 @@ class HuffmanCompressor:
         
         return original_size, compressed_size
 
-    def _deserialize_tree(self, bits_iter: iter) -> HuffmanNode:
+    def _deserialize_tree(self, packed_data: bytes, bit_pos: int) -> int:
         """
-        Rebuilds the tree from the serialized bit string.
-        This is a clean, recursive alternative to your original.
+        Reads the 256 code-length nibbles, starting at (byte-aligned)
+        'bit_pos', back into the code table.
+        Returns the bit position right after them.
         """
-        bit = next(bits_iter)
-        
-        if bit == '0': # Internal node
-            left = self._deserialize_tree(bits_iter)
-            right = self._deserialize_tree(bits_iter)
-            return HuffmanNode(freq=0, left=left, right=right)
-        else: # Leaf node
-            byte_bits = "".join(next(bits_iter) for _ in range(8))
-            byte_val = int(byte_bits, 2)
-            return HuffmanNode(freq=0, char=byte_val)
+        start = bit_pos >> 3
+        self.lens = [0] * 256
+        for i, byte in enumerate(packed_data[start:start + TREE_SIZE]):
+            self.lens[2 * i] = byte >> 4
+            self.lens[2 * i + 1] = byte & 0x0F
+        return bit_pos + TREE_SIZE * 8
 
-    def _decode_data(self, data_bits: str, text_len: int) -> bytes:
-        """Decodes the data bits using the reconstructed tree."""
-        decoded_bytes = bytearray()
+    def _lengths_are_valid(self) -> bool:
+        """
+        Checks that the code lengths read from a file form a complete
+        prefix code (Kraft sum of exactly 1), or the single-byte case of
+        one length-1 code. Anything else would give overlapping codes or
+        decode table slots with no symbol.
+        """
+        present = [length for length in self.lens if length]
+        if len(present) == 1:
+            return present[0] == 1
+        kraft = sum(1 << (MAX_CODE_LEN - length) for length in present)
+        return kraft == 1 << MAX_CODE_LEN
+
+    def _decode_data(self, packed_data: bytes, bit_pos: int, end_bit: int,
+                     text_len: int) -> bytes:
+        """
+        Decodes the data bits, which run from 'bit_pos' (right after the
+        code lengths) up to 'end_bit' (where the padding starts).
+        Raises ValueError if they run out before 'text_len' bytes.
+        """
+        # Handle edge case: single-character file (one bit per byte)
+        if self.lens.count(0) == 255:
+            if text_len > end_bit - bit_pos:
+                raise ValueError("Encoded data ends before the last symbol")
+            byte = next(byte for byte, length in enumerate(self.lens) if length)
+            return bytes([byte]) * text_len
         
-        # Handle edge case: single-character file
-        if self.tree.char is not None:
-            return bytearray([self.tree.char] * text_len)
-            
-        current_node = self.tree
-        for bit in data_bits:
-            current_node = current_node.left if bit == '0' else current_node.right
-            
-            if current_node.char is not None: # Reached a leaf
-                decoded_bytes.append(current_node.char)
-                current_node = self.tree # Reset to root
-                
-                # Stop once we've recovered all characters
-                if len(decoded_bytes) == text_len:
-                    break
-                    
-        return bytes(decoded_bytes)
+        table_sym, table_len, lookup_bits = self._build_decode_table()
+        return bytes(decode_bits(packed_data, bit_pos, end_bit, table_sym,
+                                 table_len, lookup_bits, self.children,
+                                 self.sym, text_len))
 
     def decompress(self, input_path: str, output_path: str):
         """Decompresses a file and writes the result."""
@@ -216,33 +436,30 @@ class HuffmanCompressor:
         
         # 1. Read data
         data = self._read_file(input_path)
-        if len(data) < 13: # Header size
+        if len(data) < HEADER.size:
             print("Error: File is too small or corrupt.")
             return
 
         # 2. Parse header
-        text_len = int.from_bytes(data[0:8], 'big')
-        tree_len = int.from_bytes(data[8:12], 'big')
-        padding = int.from_bytes(data[12:13], 'big')
-        
-        # 3. Unpack bits
-        packed_data = data[13:]
-        bit_string = "".join(f'{byte:08b}' for byte in packed_data)
+        text_len, tree_len, padding = HEADER.unpack_from(data, 0)
         
-        # 4. Remove padding
-        if padding > 0:
-            bit_string = bit_string[:-padding]
-            
-        # 5. Separate tree and data bits
-        tree_bits = bit_string[:tree_len]
-        data_bits = bit_string[tree_len:]
-        
-        # 6. Rebuild tree
-        self.tree = self._deserialize_tree(iter(tree_bits))
+        # 3. Read the code lengths and rebuild the canonical codes
+        packed_data = data[HEADER.size:]
+        data_pos = self._deserialize_tree(packed_data, 0)
+        end_bit = len(packed_data) * 8 - padding
+        if (data_pos != tree_len or padding > 7 or end_bit < data_pos
+                or not self._lengths_are_valid()):
+            print("Error: Code lengths do not match the header; file is corrupt.")
+            return
+        self._assign_canonical_codes()
         
-        # 7. Decode data
-        decoded_data = self._decode_data(data_bits, text_len)
+        # 4. Decode data (the bits from data_pos up to the padding)
+        try:
+            decoded_data = self._decode_data(packed_data, data_pos, end_bit, text_len)
+        except ValueError as e:
+            print(f"Error: {e}; file is truncated or corrupt.")
+            return
         
-        # 8. Write to file
+        # 5. Write to file
         self._write_file(output_path, decoded_data)
         print(f"Successfully decompressed and saved to '{output_path}'.")
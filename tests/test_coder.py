@@ -0,0 +1,154 @@
+# tests/test_coder.py
+
+"""
+Unit tests for the code-length steps of HuffmanCompressor, for
+rejecting code lengths that could not have been written by it, and
+for inputs that change between the two compression passes.
+Run with: python -m unittest discover tests
+"""
+
+import contextlib
+import heapq
+import io
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from huffman.coder import HEADER, MAX_CODE_LEN, TREE_SIZE, HuffmanCompressor
+
+def _fibonacci_table(n: int) -> list[int]:
+    """Frequencies 1, 1, 2, 3, 5, ... for the first 'n' byte values (the deepest possible tree)."""
+    freq_table = [0] * 256
+    a, b = 1, 1
+    for byte in range(n):
+        freq_table[byte] = a
+        a, b = b, a + b
+    return freq_table
+
+def _heapq_cost(freq_table: list[int]) -> int:
+    """Total encoded size in bits, sum(freq * len), of a Huffman code built with heapq."""
+    heap = [freq for freq in freq_table if freq]
+    if len(heap) == 1:
+        return heap[0]
+    heapq.heapify(heap)
+    cost = 0
+    while len(heap) > 1:
+        merged = heapq.heappop(heap) + heapq.heappop(heap)
+        cost += merged
+        heapq.heappush(heap, merged)
+    return cost
+
+class CodeLengthsTest(unittest.TestCase):
+
+    def _check_optimal(self, freq_table: list[int]):
+        compressor = HuffmanCompressor()
+        compressor._build_code_lengths(freq_table)
+        lens = compressor.lens
+
+        self.assertEqual([bool(length) for length in lens], [bool(freq) for freq in freq_table])
+        cost = sum(freq * length for freq, length in zip(freq_table, lens))
+        self.assertEqual(cost, _heapq_cost(freq_table))
+        if sum(map(bool, lens)) > 1:
+            self.assertEqual(sum(2.0 ** -length for length in lens if length), 1.0)
+
+    def test_one_symbol(self):
+        freq_table = [0] * 256
+        freq_table[ord('a')] = 7
+        self._check_optimal(freq_table)
+
+    def test_two_symbols(self):
+        freq_table = [0] * 256
+        freq_table[3], freq_table[200] = 1, 1000
+        self._check_optimal(freq_table)
+
+    def test_fibonacci(self):
+        self._check_optimal(_fibonacci_table(30))
+
+    def test_random_tables(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            freq_table = [0] * 256
+            for byte in rng.sample(range(256), rng.randint(2, 256)):
+                freq_table[byte] = rng.randint(1, rng.choice((3, 1000, 10 ** 6)))
+            with self.subTest(freq_table=freq_table):
+                self._check_optimal(freq_table)
+
+class LimitCodeLengthsTest(unittest.TestCase):
+
+    def test_fibonacci_is_capped(self):
+        freq_table = _fibonacci_table(40)
+        compressor = HuffmanCompressor()
+        compressor._build_code_table(freq_table)
+        lens = compressor.lens
+
+        self.assertLessEqual(max(lens), MAX_CODE_LEN)
+        self.assertEqual(sum(1 << (MAX_CODE_LEN - length) for length in lens if length),
+                         1 << MAX_CODE_LEN)
+        # More frequent bytes never get longer codes
+        present = sorted((byte for byte in range(256) if freq_table[byte]),
+                         key=lambda byte: freq_table[byte])
+        self.assertEqual([lens[byte] for byte in present],
+                         sorted((lens[byte] for byte in present), reverse=True))
+
+class CorruptLengthsTest(unittest.TestCase):
+
+    def _decompress_lengths(self, lengths: dict[int, int]) -> str:
+        """Decompresses a file with the given code lengths; returns what was printed."""
+        lens = [0] * 256
+        for byte, length in lengths.items():
+            lens[byte] = length
+        nibbles = bytes((lens[2 * i] << 4) | lens[2 * i + 1] for i in range(TREE_SIZE))
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, 'in.huff'), os.path.join(tmp, 'out')
+            with open(src, 'wb') as f:
+                f.write(HEADER.pack(16, TREE_SIZE * 8, 0) + nibbles + bytes(8))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                HuffmanCompressor().decompress(src, dst)
+            self.assertFalse(os.path.exists(dst))
+        return output.getvalue()
+
+    def test_over_full(self):
+        output = self._decompress_lengths({0: 1, 1: 1, 2: 1})
+        self.assertIn("file is corrupt", output)
+
+    def test_incomplete(self):
+        output = self._decompress_lengths({0: 1, 1: 2})
+        self.assertIn("file is corrupt", output)
+
+    def test_single_long_code(self):
+        output = self._decompress_lengths({0: 3})
+        self.assertIn("file is corrupt", output)
+
+class InputChangedTest(unittest.TestCase):
+
+    def _compress_changing(self, before: bytes, after: bytes):
+        """Compresses a file that is rewritten from 'before' to 'after' between the passes."""
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, 'in'), os.path.join(tmp, 'out.huff')
+            with open(src, 'wb') as f:
+                f.write(before)
+            
+            compressor = HuffmanCompressor()
+            build_code_table = compressor._build_code_table
+            def _rewrite_then_build(freq_table):
+                with open(src, 'r+b') as f:
+                    f.write(after)
+                build_code_table(freq_table)
+            
+            with mock.patch.object(compressor, '_build_code_table', _rewrite_then_build), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                with self.assertRaisesRegex(ValueError, "Input changed"):
+                    compressor.compress(src, dst)
+            self.assertFalse(os.path.exists(dst))
+
+    def test_new_byte_same_size(self):
+        self._compress_changing(b'abab' * 1000, b'abab' * 999 + b'abaz')
+
+    def test_grown(self):
+        self._compress_changing(b'abab' * 1000, b'abab' * 1001)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# tests/test_kernels.py
+
+"""
+Round-trips sample inputs through the pure-Python kernels
+(huffman._kernels), which every install uses. When the compiled kernels
+(huffman._cbits) are built, also checks that both produce byte-identical
+.huff files and that each can decode the other's output.
+
+The parity tests are skipped unless _cbits has been built:
+    cythonize -i huffman/_cbits.pyx
+Run with: python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from huffman import _kernels, coder
+from huffman.coder import CHUNK_SIZE, HuffmanCompressor
+
+try:
+    from huffman import _cbits
+except ImportError:
+    _cbits = None
+
+def _use_kernels(module):
+    """Patches the kernels HuffmanCompressor uses with those of 'module'."""
+    return mock.patch.multiple(
+        coder,
+        build_encode_table=module.build_encode_table,
+        encode_bits=module.encode_bits,
+        decode_bits=module.decode_bits,
+    )
+
+def _sample_inputs() -> dict[str, bytes]:
+    rng = random.Random(0)
+    weights = [2 ** -(i / 8) for i in range(256)]
+    return {
+        'one_byte': b'x',
+        'short': b'abcabca', # Shorter than the 8-byte unrolled step
+        'odd_length': bytes(rng.choices(range(256), weights=weights, k=10001)),
+        'all_bytes': bytes(range(256)) * 3,
+        # Spans several chunks, with long (13-15 bit) codes
+        'multi_chunk': bytes(rng.choices(range(256), weights=weights, k=CHUNK_SIZE + 3)),
+    }
+
+class _KernelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def _write_input(self, name: str, data: bytes) -> str:
+        path = self._path(name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _compress(self, module, src: str, dst: str):
+        with _use_kernels(module), contextlib.redirect_stdout(io.StringIO()):
+            HuffmanCompressor().compress(src, dst)
+
+    def _decompress(self, module, src: str, dst: str) -> bytes:
+        with _use_kernels(module), contextlib.redirect_stdout(io.StringIO()):
+            HuffmanCompressor().decompress(src, dst)
+        with open(dst, 'rb') as f:
+            return f.read()
+
+class RoundTripTest(_KernelTestCase):
+
+    def test_round_trip(self):
+        for name, data in _sample_inputs().items():
+            with self.subTest(input=name):
+                src = self._write_input(name, data)
+                huff = self._path(name + '.huff')
+                self._compress(_kernels, src, huff)
+                self.assertEqual(self._decompress(_kernels, huff, self._path('out')), data)
+
+@unittest.skipIf(_cbits is None, "huffman._cbits is not built")
+class KernelParityTest(_KernelTestCase):
+
+    def test_same_output_and_cross_decode(self):
+        for name, data in _sample_inputs().items():
+            with self.subTest(input=name):
+                src = self._write_input(name, data)
+                py_huff, c_huff = self._path(name + '.py.huff'), self._path(name + '.c.huff')
+                self._compress(_kernels, src, py_huff)
+                self._compress(_cbits, src, c_huff)
+                with open(py_huff, 'rb') as f1, open(c_huff, 'rb') as f2:
+                    self.assertEqual(f1.read(), f2.read())
+
+                self.assertEqual(self._decompress(_kernels, c_huff, self._path('out.py')), data)
+                self.assertEqual(self._decompress(_cbits, py_huff, self._path('out.c')), data)
+
+if __name__ == '__main__':
+    unittest.main()